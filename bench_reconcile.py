@@ -0,0 +1,139 @@
+"""
+Benchmark latency on_message selama REST reconciliation:
+- thread: check_maintenance_rest + process_maintenance_data (default)
+- pool:   RECONCILE_PROCESS_POOL=1 (fetch + parse + diff di process worker)
+
+Payload /spot/currencies sintetis dilayani dari HTTP server lokal.
+
+    python bench_reconcile.py [--currencies 5000] [--rounds 5]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_payload(n_currencies):
+    currencies = []
+    for i in range(n_currencies):
+        currencies.append({
+            'currency': f'C{i}',
+            'deposit_disabled': i % 7 == 0,
+            'chains': [
+                {'name': f'NET{j}', 'withdraw_disabled': (i + j) % 11 == 0}
+                for j in range(1 + i % 3)
+            ],
+        })
+    return json.dumps(currencies).encode('utf-8')
+
+
+def start_payload_server(payload):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+
+def measure(main, rounds, n_currencies):
+    """Kirim frame WS tiap 1 ms selama reconciliation, catat latency on_message"""
+    latencies = []
+    reconcile_times = []
+    running = threading.Event()
+
+    def ws_feeder():
+        i = 0
+        while running.is_set():
+            frame = json.dumps({
+                'time': int(time.time()),
+                'channel': 'spot.currency_status',
+                'event': 'update',
+                'result': {
+                    'currency': f'C{i % n_currencies}',
+                    'deposit_disabled': i % n_currencies % 7 == 0,
+                    'chains': [],
+                },
+            })
+            start = time.perf_counter()
+            main.on_message(None, frame)
+            latencies.append((time.perf_counter() - start) * 1000)
+            i += 7  # selalu currency yang deposit_disabled-nya tidak berubah
+            time.sleep(0.001)
+
+    for _ in range(rounds):
+        running.set()
+        feeder = threading.Thread(target=ws_feeder)
+        feeder.start()
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            ok = main.full_rest_check()
+        reconcile_times.append((time.perf_counter() - start) * 1000)
+
+        running.clear()
+        feeder.join()
+        if not ok:
+            raise RuntimeError("reconciliation failed")
+
+    latencies.sort()
+    return {
+        'frames': len(latencies),
+        'p50': statistics.median(latencies),
+        'p99': latencies[int(len(latencies) * 0.99) - 1],
+        'max': latencies[-1],
+        'reconcile': statistics.median(reconcile_times),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--currencies', type=int, default=5000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    port = start_payload_server(make_payload(args.currencies))
+    os.environ['GATE_REST_URL'] = f'http://127.0.0.1:{port}'
+    os.chdir(tempfile.mkdtemp())
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import main as bot
+
+    # Seed state sama dengan payload → tidak ada transisi/notifikasi
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot.full_rest_check()
+    bot.initial_data_loaded = True
+
+    print(f"📊 {args.currencies} currencies, {args.rounds} rounds per mode")
+    print(f"{'mode':<8}{'frames':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'reconcile ms':>15}")
+
+    for mode in ('thread', 'pool'):
+        bot.RECONCILE_PROCESS_POOL = mode == 'pool'
+        if bot.RECONCILE_PROCESS_POOL:
+            # Warm-up: start worker process di luar pengukuran
+            with contextlib.redirect_stdout(io.StringIO()):
+                bot.full_rest_check()
+        r = measure(bot, args.rounds, args.currencies)
+        print(
+            f"{mode:<8}{r['frames']:>8}{r['p50']:>10.3f}{r['p99']:>10.3f}"
+            f"{r['max']:>10.3f}{r['reconcile']:>15.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,55 +1,176 @@
 import json
+import math
 import time
 from datetime import datetime, timezone, timedelta
 import websocket
+try:
+    import fcntl
+except ImportError:  # non-POSIX: HA_MODE tidak tersedia
+    fcntl = None
 import threading
 import urllib.request
+import urllib.parse
+import urllib.error
 import os
+import re
+import queue
+import sqlite3
+import contextlib
+import csv
+import io
+import itertools
+import uuid
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import multiprocessing
+import socket
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
 STATE_FILE = 'maintenance_state.json'
 EXPORT_FILE = 'maintenance.txt'
+HISTORY_DB = os.getenv("HISTORY_DB", 'maintenance_history.db')
+GATE_REST_URL = os.getenv("GATE_REST_URL", "https://api.gateio.ws/api/v4")
+
+# Fetch + parse + diff REST di process terpisah (tidak berebut GIL dengan on_message)
+RECONCILE_PROCESS_POOL = os.getenv("RECONCILE_PROCESS_POOL", "0") == "1"
+
+# Active/standby: leader = pemegang flock HA_LOCK_FILE, standby tail STATE_FILE
+HA_MODE = os.getenv("HA_MODE", "0") == "1"
+HA_LOCK_FILE = os.getenv("HA_LOCK_FILE", 'maintenance.lock')
+HA_SENT_FILE = os.getenv("HA_SENT_FILE", 'maintenance_sent.log')
+HA_POLL_SECONDS = 0.2
+HA_SENT_KEEP = 5000
+INSTANCE_ID = os.getenv("INSTANCE_ID", f"{socket.gethostname()}:{os.getpid()}")
+
+# Gap-fill setelah reconnect
+GAP_FULL_REFETCH_SECONDS = int(os.getenv("GAP_FULL_REFETCH_SECONDS", "30"))
+GAP_MAX_TARGETED = int(os.getenv("GAP_MAX_TARGETED", "300"))
+GAP_FILL_CONCURRENCY = int(os.getenv("GAP_FILL_CONCURRENCY", "4"))
+GAP_RECENT_SECONDS = 120
+FRAME_LAG_SECONDS = 10
 
 previous_withdraw = {}  # Key: "CURRENCY_CHAIN" → Value: True/False
 previous_deposit = {}   # Key: "CURRENCY" → Value: True/False (tanpa chain!)
 withdraw_times = {}
 deposit_times = {}
+transition_seq = {}     # Key: "kind:KEY" → jumlah transisi (untuk transition id)
 ws_connected = False
 reconnect_count = 0
+last_alive_at = time.time()  # frame/pong terakhir dari WS
+currency_last_seen = {}      # Key: CURRENCY → epoch update terakhir (frame WS / REST)
+gap_currencies = set()       # currency dengan frame telat, dicek ulang di periodic_check
+server_clock_offset = 0.0    # waktu server - waktu lokal (dari frame WS)
+full_check_pending = False   # gap-fill targeted selesai → full REST check di tick periodic_check berikutnya
 
 state_lock = threading.Lock()
+save_lock = threading.Lock()
 initial_data_loaded = False
+reconcile_pool = None
+reconcile_pool_lock = threading.Lock()
+
+ha_lock_fd = None
+sent_lock = threading.Lock()
+sent_ids = set()                         # transition id terkirim (HA_MODE), max HA_SENT_KEEP
+sent_order = deque(maxlen=HA_SENT_KEEP)  # urutan sent_ids, yang terlama dibuang
+sent_appended = 0                        # baris ditulis ke HA_SENT_FILE sejak compact terakhir
+sent_seq_max = {}                        # Key: "kind:KEY" → seq tertinggi di HA_SENT_FILE saat takeover
+
+# Warm start: frame WS selama snapshot REST awal di-buffer lalu di-replay
+WARM_START = os.getenv("WARM_START", "0") == "1"
+boot_lock = threading.Lock()
+boot_buffer = []  # (received_at, raw message)
+BOOT_BUFFER_MAX = 10000
+boot_overflow = False  # buffer penuh → replay dilewati, diganti full REST check
+boot_reconnect_at = None  # reconnect terakhir selama boot; frame yang hilang belum tentu tercakup snapshot
+rest_fetch_started_at = 0.0  # awal attempt check_maintenance_rest terakhir
+
+# Antrian transisi untuk ditulis ke SQLite oleh history_writer (bukan dari thread WS)
+history_queue = queue.Queue()
+history_enabled = False  # True setelah init_history_db berhasil
+
+# HTTP API (read-only): dilayani dari snapshot immutable, bukan dari state_lock
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "0"))  # 0 = nonaktif
+API_MAX_WAIT = 60
+BOOT_ID = uuid.uuid4().hex[:12]  # version/ETag hanya berlaku dalam satu process
+state_snapshot = None
+pending_changes = []             # transisi sejak publish_snapshot terakhir (di bawah state_lock)
+change_log = deque(maxlen=1000)  # transisi + version untuk /changes
+change_log_floor = 0             # version transisi terakhir yang sudah terbuang dari change_log
+snapshot_cond = threading.Condition()
+
+
+WIB = timezone(timedelta(hours=7))
 
 
 def get_wib_time():
-    wib = timezone(timedelta(hours=7))
-    return datetime.now(wib).strftime('%Y-%m-%d %H:%M:%S WIB')
+    return datetime.now(WIB).strftime('%Y-%m-%d %H:%M:%S WIB')
 
 
-def load_state():
+def parse_wib_time(value):
+    """'YYYY-mm-dd HH:MM:SS WIB' -> epoch detik (None kalau tidak valid)"""
+    try:
+        dt = datetime.strptime(value, '%Y-%m-%d %H:%M:%S WIB')
+        return int(dt.replace(tzinfo=WIB).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def format_wib_ts(ts):
+    return datetime.fromtimestamp(ts, WIB).strftime('%Y-%m-%d %H:%M:%S WIB')
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "-"
+    days, rem = divmod(int(seconds), 86400)
+    hours, rem = divmod(rem, 3600)
+    minutes = rem // 60
+    if days:
+        return f"{days}d {hours}h {minutes}m"
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m"
+
+
+def load_state(quiet=False):
     if os.path.exists(STATE_FILE):
         try:
             with open(STATE_FILE, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                print(f"✅ Loaded state: {len(data.get('withdraw', {}))} withdraw, {len(data.get('deposit', {}))} deposit")
+                if not quiet:
+                    print(f"✅ Loaded state: {len(data.get('withdraw', {}))} withdraw, {len(data.get('deposit', {}))} deposit")
                 return data
         except Exception as e:
             print(f"⚠️ Error loading state: {e}")
     return None
 
 
+def copy_state():
+    """Dipanggil di bawah state_lock"""
+    return {
+        'withdraw': previous_withdraw.copy(),
+        'deposit': previous_deposit.copy(),
+        'withdraw_times': withdraw_times.copy(),
+        'deposit_times': deposit_times.copy(),
+        'transition_seq': transition_seq.copy(),
+        'last_update': get_wib_time()
+    }
+
+
 def save_state():
+    # save_lock menjaga urutan tulis file + publish snapshot; json.dump dan
+    # build snapshot di luar state_lock supaya on_message tidak tertahan
     try:
-        with state_lock:
-            data = {
-                'withdraw': previous_withdraw.copy(),
-                'deposit': previous_deposit.copy(),
-                'withdraw_times': withdraw_times.copy(),
-                'deposit_times': deposit_times.copy(),
-                'last_update': get_wib_time()
-            }
+        with save_lock:
+            with state_lock:
+                data = copy_state()
+                changes = take_pending_changes()
+            publish_snapshot(data, changes)
             temp_file = STATE_FILE + '.tmp'
             with open(temp_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2)
@@ -58,65 +179,405 @@ def save_state():
         print(f"⚠️ Error saving state: {e}")
 
 
-def generate_export_file():
-    wib = get_wib_time()
+def take_pending_changes():
+    """Dipanggil di bawah state_lock"""
+    changes = pending_changes[:]
+    pending_changes.clear()
+    return changes
 
-    content = "=" * 60 + "\n"
-    content += "📊 GATE.IO MAINTENANCE REPORT\n"
-    content += f"📅 Generated: {wib}\n"
-    content += "=" * 60 + "\n\n"
 
-    # WITHDRAW - per chain
-    content += "📤 WITHDRAW MAINTENANCE (per chain)\n"
-    content += "-" * 60 + "\n"
+def publish_snapshot(data, changes):
+    """
+    Dipanggil di bawah save_lock (bukan state_lock). Snapshot baru (immutable) untuk
+    HTTP API: version naik hanya kalau isi berubah, list sudah di-serialize sekali
+    di sini supaya request API tidak perlu menyentuh state_lock.
+    """
+    global state_snapshot, change_log_floor
+
+    old = state_snapshot
+    if old and not changes and old['withdraw'] == data['withdraw'] and old['deposit'] == data['deposit']:
+        return
+
+    version = (old['version'] if old else 0) + 1
+
+    currencies = {}
+    withdraw_items = []
+    for key, disabled in data['withdraw'].items():
+        currency, chain = key.rsplit('_', 1)
+        since = data['withdraw_times'].get(key) if disabled else None
+        currencies.setdefault(currency, []).append(
+            {'chain': chain, 'withdraw_disabled': disabled, 'since': since}
+        )
+        if disabled:
+            withdraw_items.append({'currency': currency, 'chain': chain, 'since': since})
+
+    deposit_items = [
+        {'currency': currency, 'since': data['deposit_times'].get(currency)}
+        for currency, disabled in data['deposit'].items() if disabled
+    ]
+
+    withdraw_items.sort(key=lambda x: (x['currency'], x['chain']))
+    deposit_items.sort(key=lambda x: x['currency'])
+
+    state_snapshot = {
+        'version': version,
+        'etag': f'"{BOOT_ID}-{version}"',
+        'updated': data['last_update'],
+        'withdraw': data['withdraw'],
+        'deposit': data['deposit'],
+        'deposit_times': data['deposit_times'],
+        'chains': currencies,
+        'withdraw_body': json.dumps({
+            'boot': BOOT_ID, 'version': version, 'updated': data['last_update'],
+            'count': len(withdraw_items), 'items': withdraw_items
+        }).encode('utf-8'),
+        'deposit_body': json.dumps({
+            'boot': BOOT_ID, 'version': version, 'updated': data['last_update'],
+            'count': len(deposit_items), 'items': deposit_items
+        }).encode('utf-8'),
+    }
+
+    with snapshot_cond:
+        for change in changes:
+            if len(change_log) == change_log.maxlen:
+                change_log_floor = change_log[0]['version']
+            change_log.append(dict(change, version=version))
+        snapshot_cond.notify_all()
+
+
+def open_history_db():
+    conn = sqlite3.connect(HISTORY_DB, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def init_history_db():
+    """
+    Riwayat semua transisi maintenance:
+    - ts: epoch transisi, since_ts + duration hanya untuk 'keluar'
+    - chain NULL untuk deposit (per currency)
+    - tid: transition id (HA_MODE), UNIQUE → transisi yang dideteksi ulang leader baru tidak dobel
+    """
+    try:
+        conn = open_history_db()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS transitions (
+                id INTEGER PRIMARY KEY,
+                ts INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                currency TEXT NOT NULL,
+                chain TEXT,
+                action TEXT NOT NULL,
+                since_ts INTEGER,
+                duration INTEGER,
+                tid TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_transitions_currency_ts ON transitions(currency, ts);
+            CREATE INDEX IF NOT EXISTS idx_transitions_ts ON transitions(ts);
+            CREATE INDEX IF NOT EXISTS idx_transitions_duration
+                ON transitions(duration) WHERE duration IS NOT NULL;
+        """)
+        # DB lama (sebelum kolom tid)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(transitions)")]
+        if 'tid' not in columns:
+            conn.execute("ALTER TABLE transitions ADD COLUMN tid TEXT")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_transitions_tid ON transitions(tid)")
+        conn.commit()
+        conn.close()
+        print(f"✅ History DB ready: {HISTORY_DB}")
+        return True
+    except Exception as e:
+        print(f"⚠️ Error init history DB: {e}")
+        return False
+
+
+def record_transition(kind, action, currency, chain, since=None):
+    """
+    Dipanggil di bawah state_lock → cukup masuk antrian, insert dilakukan history_writer.
+    Return transition id (kind:key:seq) untuk de-duplikasi notifikasi antar instance.
+    """
+    key = f"{currency}_{chain}" if kind == 'withdraw' else currency
+    seq_key = f"{kind}:{key}"
+    transition_seq[seq_key] = transition_seq.get(seq_key, 0) + 1
+
+    tid = f"{seq_key}:{transition_seq[seq_key]}"
+
+    ts = int(time.time())
+    since_ts = parse_wib_time(since) if action == 'keluar' else None
+    duration = ts - since_ts if since_ts is not None else None
+    # tid hanya dijamin unik antar instance di HA_MODE; NULL tidak kena UNIQUE
+    if history_enabled:
+        history_queue.put((ts, kind, currency, chain, action, since_ts, duration, tid if HA_MODE else None))
+    pending_changes.append({
+        'id': tid, 'kind': kind, 'action': action, 'currency': currency, 'chain': chain, 'ts': ts
+    })
+    return tid
+
+
+def history_writer():
+    print("🗄️ History writer started")
+    conn = open_history_db()
+
+    while True:
+        batch = [history_queue.get()]
+        # Tunggu sebentar supaya burst transisi masuk satu transaksi
+        time.sleep(0.5)
+        while len(batch) < 500:
+            try:
+                batch.append(history_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO transitions "
+                "(ts, kind, currency, chain, action, since_ts, duration, tid) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                batch
+            )
+            conn.commit()
+        except Exception as e:
+            print(f"\n⚠️ Error writing history ({len(batch)} rows): {e}")
+        finally:
+            for _ in batch:
+                history_queue.task_done()
+
+
+def flush_history(timeout=5):
+    if not history_enabled:
+        return
+    deadline = time.time() + timeout
+    while history_queue.unfinished_tasks and time.time() < deadline:
+        time.sleep(0.1)
+
+
+def get_history(currency, limit=20):
+    conn = open_history_db()
+    try:
+        return conn.execute(
+            "SELECT ts, kind, chain, action, duration FROM transitions "
+            "WHERE currency = ? ORDER BY ts DESC, id DESC LIMIT ?",
+            (currency, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+
 
+def get_stats_longest(limit=10):
+    conn = open_history_db()
+    try:
+        return conn.execute(
+            "SELECT currency, chain, kind, since_ts, ts, duration FROM transitions "
+            "WHERE duration IS NOT NULL ORDER BY duration DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def get_stats_window(seconds):
+    since_ts = int(time.time()) - seconds
+    conn = open_history_db()
+    try:
+        counts = conn.execute(
+            "SELECT kind, action, COUNT(*) FROM transitions WHERE ts >= ? GROUP BY kind, action",
+            (since_ts,)
+        ).fetchall()
+        top = conn.execute(
+            "SELECT currency, COUNT(*) AS c FROM transitions WHERE ts >= ? AND action = 'masuk' "
+            "GROUP BY currency ORDER BY c DESC LIMIT 10",
+            (since_ts,)
+        ).fetchall()
+        durations = conn.execute(
+            "SELECT AVG(duration), MAX(duration) FROM transitions "
+            "WHERE ts >= ? AND duration IS NOT NULL",
+            (since_ts,)
+        ).fetchone()
+        return counts, top, durations
+    finally:
+        conn.close()
+
+
+def parse_window(arg):
+    """'7d' / '24h' -> detik"""
+    match = re.fullmatch(r'(\d+)([dh])', arg or '')
+    if not match:
+        return None
+    value, unit = int(match.group(1)), match.group(2)
+    return value * (86400 if unit == 'd' else 3600)
+
+
+def format_history_reply(currency, rows):
+    if not rows:
+        return f"📜 <b>HISTORY {currency}</b>\n\nℹ️ Belum ada riwayat"
+
+    reply = f"📜 <b>HISTORY {currency}</b>\n(last {len(rows)})\n\n"
+    for ts, kind, chain, action, duration in rows:
+        emoji = "🔴" if action == 'masuk' else "🟢"
+        type_text = "Withdraw" if kind == 'withdraw' else "Deposit"
+        name = f"{type_text} ({chain})" if chain else type_text
+        reply += f"{emoji} {format_wib_ts(ts)} | {name}"
+        if duration is not None:
+            reply += f" | {format_duration(duration)}"
+        reply += "\n"
+    return reply
+
+
+def format_stats_reply(arg):
+    if arg == 'longest':
+        rows = get_stats_longest()
+        if not rows:
+            return "📈 <b>LONGEST MAINTENANCE</b>\n\nℹ️ Belum ada riwayat"
+        reply = "📈 <b>LONGEST MAINTENANCE</b>\n\n"
+        for i, (currency, chain, kind, since_ts, ts, duration) in enumerate(rows, 1):
+            type_text = "W" if kind == 'withdraw' else "D"
+            name = f"{currency} ({chain})" if chain else currency
+            reply += f"{i}. {name} [{type_text}] | {format_duration(duration)}\n"
+            reply += f"   {format_wib_ts(since_ts)} → {format_wib_ts(ts)}\n"
+        return reply
+
+    seconds = parse_window(arg)
+    if seconds is None:
+        return "ℹ️ Usage: /stats longest | /stats 7d | /stats 24h"
+
+    counts, top, (avg_duration, max_duration) = get_stats_window(seconds)
+    totals = {(kind, action): count for kind, action, count in counts}
+
+    reply = f"📈 <b>STATS {arg}</b>\n\n"
+    reply += f"📤 Withdraw: 🔴 {totals.get(('withdraw', 'masuk'), 0)} | 🟢 {totals.get(('withdraw', 'keluar'), 0)}\n"
+    reply += f"📥 Deposit: 🔴 {totals.get(('deposit', 'masuk'), 0)} | 🟢 {totals.get(('deposit', 'keluar'), 0)}\n"
+    reply += f"⏱️ Avg: {format_duration(avg_duration)} | Max: {format_duration(max_duration)}\n"
+    if top:
+        reply += "\n🏆 <b>Most maintenance:</b>\n"
+        for i, (currency, count) in enumerate(top, 1):
+            reply += f"{i}. {currency} ({count}x)\n"
+    return reply
+
+
+def get_export_lists(data):
     withdraw_list = []
-    with state_lock:
-        for key, disabled in previous_withdraw.items():
-            if disabled:
-                currency, chain = key.rsplit('_', 1)
-                coin_time = withdraw_times.get(key, "Unknown")
-                withdraw_list.append((currency, chain, coin_time))
+    for key, disabled in data['withdraw'].items():
+        if disabled:
+            currency, chain = key.rsplit('_', 1)
+            withdraw_list.append((currency, chain, data['withdraw_times'].get(key, "Unknown")))
+
+    deposit_list = [
+        (currency, data['deposit_times'].get(currency, "Unknown"))
+        for currency, disabled in data['deposit'].items() if disabled
+    ]
+
+    withdraw_list.sort(key=lambda x: x[0])
+    deposit_list.sort(key=lambda x: x[0])
+    return withdraw_list, deposit_list
+
+
+def iter_export_txt(data):
+    withdraw_list, deposit_list = get_export_lists(data)
+
+    yield "=" * 60 + "\n"
+    yield "📊 GATE.IO MAINTENANCE REPORT\n"
+    yield f"📅 Generated: {data['last_update']}\n"
+    yield "=" * 60 + "\n\n"
+
+    # WITHDRAW - per chain
+    yield "📤 WITHDRAW MAINTENANCE (per chain)\n"
+    yield "-" * 60 + "\n"
 
     if withdraw_list:
-        withdraw_list.sort(key=lambda x: x[0])
         for i, (currency, chain, coin_time) in enumerate(withdraw_list, 1):
-            content += f"{i}. {currency} - {chain}\n"
-            content += f"   Maintenance since: {coin_time}\n"
+            yield f"{i}. {currency} - {chain}\n   Maintenance since: {coin_time}\n"
     else:
-        content += "✅ Tidak ada coin dalam maintenance\n"
+        yield "✅ Tidak ada coin dalam maintenance\n"
 
-    content += f"\nTotal: {len(withdraw_list)} chains\n"
-    content += "\n" + "=" * 60 + "\n\n"
+    yield f"\nTotal: {len(withdraw_list)} chains\n"
+    yield "\n" + "=" * 60 + "\n\n"
 
     # DEPOSIT - per currency (tanpa chain)
-    content += "📥 DEPOSIT MAINTENANCE (per currency)\n"
-    content += "-" * 60 + "\n"
-
-    deposit_list = []
-    with state_lock:
-        for currency, disabled in previous_deposit.items():
-            if disabled:
-                coin_time = deposit_times.get(currency, "Unknown")
-                deposit_list.append((currency, coin_time))
+    yield "📥 DEPOSIT MAINTENANCE (per currency)\n"
+    yield "-" * 60 + "\n"
 
     if deposit_list:
-        deposit_list.sort(key=lambda x: x[0])
         for i, (currency, coin_time) in enumerate(deposit_list, 1):
-            content += f"{i}. {currency}\n"
-            content += f"   Maintenance since: {coin_time}\n"
+            yield f"{i}. {currency}\n   Maintenance since: {coin_time}\n"
     else:
-        content += "✅ Tidak ada coin dalam maintenance\n"
+        yield "✅ Tidak ada coin dalam maintenance\n"
+
+    yield f"\nTotal: {len(deposit_list)} coins\n"
+    yield "\n" + "=" * 60 + "\n"
+    yield "🤖 Gate.io Maintenance Bot\n"
+    yield "=" * 60 + "\n"
+
+
+def iter_export_csv(data):
+    withdraw_list, deposit_list = get_export_lists(data)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    rows = itertools.chain(
+        [('type', 'currency', 'chain', 'since')],
+        (('withdraw', currency, chain, coin_time) for currency, chain, coin_time in withdraw_list),
+        (('deposit', currency, '', coin_time) for currency, coin_time in deposit_list),
+    )
+
+    # Baris dibuat satu per satu dan buffer dikosongkan tiap baris → tidak ada salinan report utuh di memory
+    for row in rows:
+        writer.writerow(row)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+
+
+def iter_export_json(data):
+    withdraw_list, deposit_list = get_export_lists(data)
+    report = {
+        'generated': data['last_update'],
+        'withdraw': [
+            {'currency': currency, 'chain': chain, 'since': coin_time}
+            for currency, chain, coin_time in withdraw_list
+        ],
+        'deposit': [
+            {'currency': currency, 'since': coin_time}
+            for currency, coin_time in deposit_list
+        ],
+    }
+    yield from json.JSONEncoder(indent=2, ensure_ascii=False).iterencode(report)
+
+
+def iter_state_json(data):
+    """Isi sama dengan STATE_FILE, tapi langsung dari memory"""
+    yield from json.JSONEncoder(indent=2).iterencode(data)
+
+
+EXPORT_FORMATS = {
+    'txt': iter_export_txt,
+    'csv': iter_export_csv,
+    'json': iter_export_json,
+}
 
-    content += f"\nTotal: {len(deposit_list)} coins\n"
-    content += "\n" + "=" * 60 + "\n"
-    content += "🤖 Gate.io Maintenance Bot\n"
-    content += "=" * 60 + "\n"
 
-    with open(EXPORT_FILE, 'w', encoding='utf-8') as f:
-        f.write(content)
+def encode_chunks(chunks, chunk_size=64 * 1024):
+    """str chunks → bytes, digabung sampai ~chunk_size supaya upload tidak terlalu banyak chunk kecil"""
+    pending = []
+    size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            yield ''.join(pending).encode('utf-8')
+            pending = []
+            size = 0
+    if pending:
+        yield ''.join(pending).encode('utf-8')
 
-    return EXPORT_FILE
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31 = format gzip
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
 
 
 def send_telegram(message):
@@ -145,6 +606,55 @@ def send_telegram(message):
     return False
 
 
+def remember_sent_id(transition_id):
+    """Dipanggil di bawah sent_lock"""
+    if transition_id in sent_ids:
+        return
+    if len(sent_order) == sent_order.maxlen:
+        sent_ids.discard(sent_order[0])
+    sent_order.append(transition_id)
+    sent_ids.add(transition_id)
+
+
+def compact_sent_log():
+    """Dipanggil di bawah sent_lock: HA_SENT_FILE hanya menyimpan HA_SENT_KEEP id terakhir"""
+    global sent_appended
+
+    temp_file = HA_SENT_FILE + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        f.write("".join(f"{tid}\n" for tid in sent_order))
+    os.replace(temp_file, HA_SENT_FILE)
+    sent_appended = 0
+
+
+def send_notification(transition_id, message):
+    """HA_MODE: send_telegram sekali per transition id, id terkirim dicatat di HA_SENT_FILE"""
+    global sent_appended
+
+    if not HA_MODE:
+        return send_telegram(message)
+
+    with sent_lock:
+        if transition_id in sent_ids:
+            print(f"\nℹ️ Skip duplicate notification: {transition_id}")
+            return True
+
+    if not send_telegram(message):
+        return False
+
+    with sent_lock:
+        remember_sent_id(transition_id)
+        try:
+            with open(HA_SENT_FILE, 'a', encoding='utf-8') as f:
+                f.write(transition_id + "\n")
+            sent_appended += 1
+            if sent_appended > HA_SENT_KEEP:
+                compact_sent_log()
+        except Exception as e:
+            print(f"\n⚠️ Error writing sent log: {e}")
+    return True
+
+
 def send_telegram_to(chat_id, message):
     for attempt in range(3):
         try:
@@ -166,28 +676,29 @@ def send_telegram_to(chat_id, message):
     return False
 
 
-def send_telegram_file(chat_id, filepath, caption=""):
+def send_telegram_document(chat_id, filename, chunks, caption=""):
+    """
+    Upload multipart/form-data secara streaming (Transfer-Encoding: chunked):
+    isi file langsung dari generator, tanpa file sementara dan tanpa body utuh di memory.
+    """
     try:
         url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendDocument"
-        boundary = '----WebKitFormBoundary7MA4YWxkTrZu0gW'
-
-        with open(filepath, 'rb') as f:
-            file_content = f.read()
-
-        filename = os.path.basename(filepath)
-
-        body = b''
-        body += f'--{boundary}\r\n'.encode()
-        body += f'Content-Disposition: form-data; name="chat_id"\r\n\r\n{chat_id}\r\n'.encode()
-        body += f'--{boundary}\r\n'.encode()
-        body += f'Content-Disposition: form-data; name="document"; filename="{filename}"\r\n'.encode()
-        body += f'Content-Type: application/octet-stream\r\n\r\n'.encode()
-        body += file_content
-        body += f'\r\n--{boundary}\r\n'.encode()
-        body += f'Content-Disposition: form-data; name="caption"\r\n\r\n{caption}\r\n'.encode()
-        body += f'--{boundary}--\r\n'.encode()
-
-        req = urllib.request.Request(url, data=body)
+        boundary = uuid.uuid4().hex  # unik per request → aman untuk export paralel
+
+        def body():
+            yield (
+                f'--{boundary}\r\n'
+                f'Content-Disposition: form-data; name="chat_id"\r\n\r\n{chat_id}\r\n'
+                f'--{boundary}\r\n'
+                f'Content-Disposition: form-data; name="caption"\r\n\r\n{caption}\r\n'
+                f'--{boundary}\r\n'
+                f'Content-Disposition: form-data; name="document"; filename="{filename}"\r\n'
+                f'Content-Type: application/octet-stream\r\n\r\n'
+            ).encode()
+            yield from chunks
+            yield f'\r\n--{boundary}--\r\n'.encode()
+
+        req = urllib.request.Request(url, data=body())
         req.add_header('Content-Type', f'multipart/form-data; boundary={boundary}')
 
         with urllib.request.urlopen(req, timeout=30) as response:
@@ -243,13 +754,16 @@ def get_telegram_updates(offset=None):
 
 
 def check_maintenance_rest():
-    url = "https://api.gateio.ws/api/v4/spot/currencies"
+    url = f"{GATE_REST_URL}/spot/currencies"
     req = urllib.request.Request(url)
     req.add_header('User-Agent', 'Mozilla/5.0')
 
+    global rest_fetch_started_at
+
     for attempt in range(5):
         try:
             print(f"\r📡 Fetching data... (attempt {attempt+1}/5)", end="", flush=True)
+            rest_fetch_started_at = time.time()
             with urllib.request.urlopen(req, timeout=60) as response:
                 data = response.read()
                 print("\r✅ Data received!                         ")
@@ -265,6 +779,26 @@ def check_maintenance_rest():
     return None
 
 
+def parse_currency_maps(currencies):
+    current_withdraw = {}  # Key: CURRENCY_CHAIN
+    current_deposit = {}   # Key: CURRENCY (tanpa chain!)
+
+    for coin in currencies:
+        currency = coin.get('currency')
+        
+        # ✅ DEPOSIT: Ambil dari level currency langsung!
+        deposit_disabled = coin.get('deposit_disabled', False)
+        current_deposit[currency] = deposit_disabled
+        
+        # ✅ WITHDRAW: Ambil dari setiap chain
+        for chain in coin.get('chains', []):
+            chain_name = chain.get('name')
+            key = f"{currency}_{chain_name}"
+            current_withdraw[key] = chain.get('withdraw_disabled', False)
+
+    return current_withdraw, current_deposit
+
+
 def process_maintenance_data(currencies, loaded_state):
     """
     ✅ FIXED: 
@@ -283,21 +817,7 @@ def process_maintenance_data(currencies, loaded_state):
     print(f"\n🔴 CURRENT MAINTENANCE ({wib_now}):")
     print("=" * 60)
 
-    current_withdraw = {}  # Key: CURRENCY_CHAIN
-    current_deposit = {}   # Key: CURRENCY (tanpa chain!)
-
-    for coin in currencies:
-        currency = coin.get('currency')
-        
-        # ✅ DEPOSIT: Ambil dari level currency langsung!
-        deposit_disabled = coin.get('deposit_disabled', False)
-        current_deposit[currency] = deposit_disabled
-        
-        # ✅ WITHDRAW: Ambil dari setiap chain
-        for chain in coin.get('chains', []):
-            chain_name = chain.get('name')
-            key = f"{currency}_{chain_name}"
-            current_withdraw[key] = chain.get('withdraw_disabled', False)
+    current_withdraw, current_deposit = parse_currency_maps(currencies)
 
     changes = []
 
@@ -314,9 +834,12 @@ def process_maintenance_data(currencies, loaded_state):
             if prev_w is not None:
                 if prev_w == False and curr_w == True:
                     withdraw_times[key] = wib_now
-                    changes.append(('withdraw', 'masuk', currency, chain_name, key))
+                    tid = record_transition('withdraw', 'masuk', currency, chain_name)
+                    changes.append(('withdraw', 'masuk', currency, chain_name, key, tid))
                 elif prev_w == True and curr_w == False:
-                    changes.append(('withdraw', 'keluar', currency, chain_name, key))
+                    since = withdraw_times.get(key, old_withdraw_times.get(key))
+                    tid = record_transition('withdraw', 'keluar', currency, chain_name, since)
+                    changes.append(('withdraw', 'keluar', currency, chain_name, key, tid))
                     if key in withdraw_times:
                         del withdraw_times[key]
                 elif prev_w == True and curr_w == True:
@@ -335,9 +858,12 @@ def process_maintenance_data(currencies, loaded_state):
             if prev_d is not None:
                 if prev_d == False and curr_d == True:
                     deposit_times[currency] = wib_now
-                    changes.append(('deposit', 'masuk', currency, None, currency))
+                    tid = record_transition('deposit', 'masuk', currency, None)
+                    changes.append(('deposit', 'masuk', currency, None, currency, tid))
                 elif prev_d == True and curr_d == False:
-                    changes.append(('deposit', 'keluar', currency, None, currency))
+                    since = deposit_times.get(currency, old_deposit_times.get(currency))
+                    tid = record_transition('deposit', 'keluar', currency, None, since)
+                    changes.append(('deposit', 'keluar', currency, None, currency, tid))
                     if currency in deposit_times:
                         del deposit_times[currency]
                 elif prev_d == True and curr_d == True:
@@ -359,44 +885,197 @@ def process_maintenance_data(currencies, loaded_state):
 
     # Kirim notifikasi perubahan
     if loaded_state and changes:
-        print(f"\n📊 Detected {len(changes)} changes:")
+        notify_changes(changes, wib_now)
 
-        for change_type, action, currency, chain_name, key in changes:
-            type_text = "Withdraw" if change_type == 'withdraw' else "Deposit"
+    elif loaded_state:
+        print(f"\n✅ No changes since last run")
+    else:
+        print(f"\n📝 First run - state saved")
 
-            if action == 'masuk':
-                emoji = "🔴"
-                action_text = "Masuk Maintenance"
-            else:
-                emoji = "🟢"
-                action_text = "Keluar Maintenance"
+    save_state()
 
-            # Format display berbeda untuk withdraw (ada chain) vs deposit (tanpa chain)
-            if change_type == 'withdraw':
-                display_name = f"{currency} ({chain_name})"
-            else:
-                display_name = currency
 
-            print(f"   {emoji} {display_name} ({type_text} {action_text})")
+def notify_changes(changes, wib_now):
+    print(f"\n📊 Detected {len(changes)} changes:")
 
-            tg_msg = f"{emoji} <b>{type_text} {action_text}</b>\n\n"
-            tg_msg += f"💰 Coin  : <b>{display_name}</b>\n"
-            tg_msg += f"📅 Time  : {wib_now}"
+    for change_type, action, currency, chain_name, key, tid in changes:
+        type_text = "Withdraw" if change_type == 'withdraw' else "Deposit"
 
-            result = send_telegram(tg_msg)
-            if result:
-                print(f"   ✅ Notifikasi terkirim: {display_name}")
-            else:
-                print(f"   ❌ GAGAL kirim notifikasi: {display_name}")
+        if action == 'masuk':
+            emoji = "🔴"
+            action_text = "Masuk Maintenance"
+        else:
+            emoji = "🟢"
+            action_text = "Keluar Maintenance"
 
-            time.sleep(0.3)
+        # Format display berbeda untuk withdraw (ada chain) vs deposit (tanpa chain)
+        if change_type == 'withdraw':
+            display_name = f"{currency} ({chain_name})"
+        else:
+            display_name = currency
 
-    elif loaded_state:
-        print(f"\n✅ No changes since last run")
-    else:
-        print(f"\n📝 First run - state saved")
+        print(f"   {emoji} {display_name} ({type_text} {action_text})")
+
+        tg_msg = f"{emoji} <b>{type_text} {action_text}</b>\n\n"
+        tg_msg += f"💰 Coin  : <b>{display_name}</b>\n"
+        tg_msg += f"📅 Time  : {wib_now}"
+
+        result = send_notification(tid, tg_msg)
+        if result:
+            print(f"   ✅ Notifikasi terkirim: {display_name}")
+        else:
+            print(f"   ❌ GAGAL kirim notifikasi: {display_name}")
+
+        time.sleep(0.3)
+
+
+def get_state_digest():
+    """Dipanggil di bawah state_lock. Ringkasan state yang dikirim ke worker."""
+    return {
+        'withdraw_known': frozenset(previous_withdraw),
+        'withdraw_disabled': frozenset(k for k, v in previous_withdraw.items() if v),
+        'deposit_known': frozenset(previous_deposit),
+        'deposit_disabled': frozenset(k for k, v in previous_deposit.items() if v),
+    }
+
+
+def diff_against_digest(current, known, disabled):
+    """
+    Sama dengan aturan process_maintenance_data, tapi terhadap digest:
+    key hilang dianggap False, key baru tidak dianggap transisi.
+    """
+    masuk, keluar, new_disabled = [], [], []
+    for key in current.keys() | known:
+        curr = current.get(key, False)
+        if key not in known:
+            if curr:
+                new_disabled.append(key)
+        elif curr and key not in disabled:
+            masuk.append(key)
+        elif not curr and key in disabled:
+            keluar.append(key)
+
+    updated = {k: v for k, v in current.items() if k not in known or v != (k in disabled)}
+    removed = list(known - current.keys())
+    return {
+        'masuk': masuk,
+        'keluar': keluar,
+        'new_disabled': new_disabled,
+        'updated': updated,
+        'removed': removed,
+        'total': len(current),
+        'disabled': sum(1 for v in current.values() if v),
+    }
+
+
+def reconcile_worker(digest):
+    """Jalan di process worker: fetch + json.loads + diff, return hanya delta"""
+    # Output progress fetch tidak ke console worker; status dicetak process utama
+    with contextlib.redirect_stdout(io.StringIO()):
+        currencies = check_maintenance_rest()
+    if not currencies or currencies == "exit":
+        return None
+
+    current_withdraw, current_deposit = parse_currency_maps(currencies)
+    return {
+        'withdraw': diff_against_digest(
+            current_withdraw, digest['withdraw_known'], digest['withdraw_disabled']
+        ),
+        'deposit': diff_against_digest(
+            current_deposit, digest['deposit_known'], digest['deposit_disabled']
+        ),
+    }
+
+
+def apply_reconcile_delta(delta, digest, current, times, kind, wib_now, changes):
+    """
+    Dipanggil di bawah state_lock. Transisi hanya diterapkan kalau nilai sekarang
+    masih sama dengan digest (kalau tidak, frame WS sudah lebih dulu mengubahnya).
+    """
+    known = digest[f'{kind}_known']
+    disabled = digest[f'{kind}_disabled']
+
+    def unchanged(key):
+        return current.get(key) == ((key in disabled) if key in known else None)
+
+    for key in delta['masuk']:
+        if not unchanged(key):
+            continue
+        currency, chain_name = key.rsplit('_', 1) if kind == 'withdraw' else (key, None)
+        times[key] = wib_now
+        tid = record_transition(kind, 'masuk', currency, chain_name)
+        changes.append((kind, 'masuk', currency, chain_name, key, tid))
+
+    for key in delta['keluar']:
+        if not unchanged(key):
+            continue
+        currency, chain_name = key.rsplit('_', 1) if kind == 'withdraw' else (key, None)
+        tid = record_transition(kind, 'keluar', currency, chain_name, times.get(key))
+        changes.append((kind, 'keluar', currency, chain_name, key, tid))
+        times.pop(key, None)
+
+    for key in delta['new_disabled']:
+        if unchanged(key):
+            times[key] = wib_now
+
+    for key, value in delta['updated'].items():
+        if unchanged(key):
+            current[key] = value
+
+    for key in delta['removed']:
+        if unchanged(key):
+            del current[key]
+
+
+def get_reconcile_pool():
+    global reconcile_pool
+    # periodic_check, /check dan post_reconnect_check bisa memanggil bersamaan
+    with reconcile_pool_lock:
+        if reconcile_pool is None:
+            # spawn: jangan fork process yang punya banyak thread + lock
+            reconcile_pool = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context('spawn')
+            )
+        return reconcile_pool
+
+
+def reconcile_in_process_pool():
+    """Pengganti check_maintenance_rest + process_maintenance_data saat RECONCILE_PROCESS_POOL=1"""
+    with state_lock:
+        digest = get_state_digest()
+
+    print("📡 Fetching data (worker)...")
+    try:
+        result = get_reconcile_pool().submit(reconcile_worker, digest).result(timeout=600)
+    except Exception as e:
+        print(f"\n❌ Reconcile worker error: {e}")
+        return False
+
+    if result is None:
+        print("❌ Reconcile worker: fetch failed")
+        return False
+
+    wib_now = get_wib_time()
+    changes = []
+    with state_lock:
+        apply_reconcile_delta(
+            result['withdraw'], digest, previous_withdraw, withdraw_times, 'withdraw', wib_now, changes
+        )
+        apply_reconcile_delta(
+            result['deposit'], digest, previous_deposit, deposit_times, 'deposit', wib_now, changes
+        )
+
+    w, d = result['withdraw'], result['deposit']
+    print(f"\n🔴 CURRENT MAINTENANCE ({wib_now}):")
+    print(f"📤 Withdraw Disabled: {w['disabled']} chains")
+    print(f"📥 Deposit Disabled: {d['disabled']} coins")
+    print(f"📊 Total Tracking: {w['total']} chains, {d['total']} coins")
+
+    if changes:
+        notify_changes(changes, wib_now)
 
     save_state()
+    return True
 
 
 def get_withdraw_list():
@@ -422,6 +1101,40 @@ def get_deposit_list():
     return coins
 
 
+def send_export(chat_id, fmt, compress=False):
+    """
+    Render report langsung ke upload Telegram (stream), dari salinan state saat ini.
+    fmt: txt / csv / json, atau 'state' untuk state JSON (/export_json).
+    """
+    with state_lock:
+        data = copy_state()
+
+    if fmt == 'state':
+        title = "📊 State JSON"
+        filename = os.path.basename(STATE_FILE)
+        chunks = iter_state_json(data)
+    else:
+        title = "📊 Maintenance Report"
+        filename = f"{os.path.splitext(EXPORT_FILE)[0]}.{fmt}"
+        chunks = EXPORT_FORMATS[fmt](data)
+
+    chunks = encode_chunks(chunks)
+    if compress:
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+
+    w = sum(1 for v in data['withdraw'].values() if v)
+    d = sum(1 for v in data['deposit'].values() if v)
+    caption = (
+        f"{title}\n"
+        f"📅 {data['last_update']}\n"
+        f"📤 Withdraw: {w} chains\n"
+        f"📥 Deposit: {d} coins"
+    )
+    if not send_telegram_document(chat_id, filename, chunks, caption):
+        send_telegram_to(chat_id, "❌ Gagal mengirim file")
+
+
 def telegram_handler():
     print("📱 Telegram handler started")
     last_update_id = None
@@ -440,7 +1153,9 @@ def telegram_handler():
                 if not text or not chat_id:
                     continue
 
-                command = text.split('@')[0].lower() if text.startswith('/') else ''
+                parts = text.split()
+                command = parts[0].split('@')[0].lower() if text.startswith('/') else ''
+                args = parts[1:]
 
                 if command == '/start':
                     reply = "🤖 <b>Gate.io Maintenance Bot</b>\n\n"
@@ -448,8 +1163,10 @@ def telegram_handler():
                     reply += "/withdraw - List withdraw maintenance (per chain)\n"
                     reply += "/deposit - List deposit maintenance (per coin)\n"
                     reply += "/check - Force re-check dari REST API\n"
-                    reply += "/export - Download maintenance.txt\n"
-                    reply += "/export_json - Download state JSON\n"
+                    reply += "/export [txt|csv|json] [gz] - Download report\n"
+                    reply += "/export_json [gz] - Download state JSON\n"
+                    reply += "/history BTC - Riwayat maintenance coin\n"
+                    reply += "/stats longest | 7d - Statistik maintenance\n"
                     reply += "/status - Bot status\n"
                     send_telegram_to(chat_id, reply)
 
@@ -462,11 +1179,11 @@ def telegram_handler():
                     send_long_message(chat_id, "📥 <b>DEPOSIT MAINTENANCE</b>\n(per currency)", coins)
 
                 elif command == '/check':
+                    if not initial_data_loaded:
+                        send_telegram_to(chat_id, "⏳ Initial REST snapshot masih berjalan")
+                        continue
                     send_telegram_to(chat_id, "⏳ Force checking REST API...")
-                    currencies = check_maintenance_rest()
-                    if currencies and currencies != "exit":
-                        loaded_state = load_state()
-                        process_maintenance_data(currencies, loaded_state)
+                    if full_rest_check():
                         w = sum(1 for v in previous_withdraw.values() if v)
                         d = sum(1 for v in previous_deposit.values() if v)
                         send_telegram_to(
@@ -477,36 +1194,31 @@ def telegram_handler():
                         send_telegram_to(chat_id, "❌ Gagal fetch data")
 
                 elif command == '/export':
+                    fmt = next((arg for arg in args if arg.lower() in EXPORT_FORMATS), 'txt').lower()
+                    compress = any(arg.lower() in ('gz', 'gzip') for arg in args)
                     send_telegram_to(chat_id, "⏳ Generating file...")
-                    filepath = generate_export_file()
-                    wib = get_wib_time()
-                    w = sum(1 for v in previous_withdraw.values() if v)
-                    d = sum(1 for v in previous_deposit.values() if v)
-                    caption = (
-                        f"📊 Maintenance Report\n"
-                        f"📅 {wib}\n"
-                        f"📤 Withdraw: {w} chains\n"
-                        f"📥 Deposit: {d} coins"
-                    )
-                    if not send_telegram_file(chat_id, filepath, caption):
-                        send_telegram_to(chat_id, "❌ Gagal mengirim file")
+                    threading.Thread(target=send_export, args=(chat_id, fmt, compress), daemon=True).start()
 
                 elif command == '/export_json':
-                    save_state()
-                    if os.path.exists(STATE_FILE):
-                        wib = get_wib_time()
-                        w = sum(1 for v in previous_withdraw.values() if v)
-                        d = sum(1 for v in previous_deposit.values() if v)
-                        caption = (
-                            f"📊 State JSON\n"
-                            f"📅 {wib}\n"
-                            f"📤 Withdraw: {w} chains\n"
-                            f"📥 Deposit: {d} coins"
-                        )
-                        if not send_telegram_file(chat_id, STATE_FILE, caption):
-                            send_telegram_to(chat_id, "❌ Gagal mengirim file")
-                    else:
-                        send_telegram_to(chat_id, "❌ State file tidak ditemukan")
+                    compress = any(arg.lower() in ('gz', 'gzip') for arg in args)
+                    threading.Thread(target=send_export, args=(chat_id, 'state', compress), daemon=True).start()
+
+                elif command == '/history':
+                    if not args:
+                        send_telegram_to(chat_id, "ℹ️ Usage: /history BTC")
+                        continue
+                    if not history_enabled:
+                        send_telegram_to(chat_id, "⚠️ History DB tidak tersedia")
+                        continue
+                    currency = args[0].upper()
+                    send_telegram_to(chat_id, format_history_reply(currency, get_history(currency)))
+
+                elif command == '/stats':
+                    if not history_enabled:
+                        send_telegram_to(chat_id, "⚠️ History DB tidak tersedia")
+                        continue
+                    arg = args[0].lower() if args else '7d'
+                    send_telegram_to(chat_id, format_stats_reply(arg))
 
                 elif command == '/status':
                     wib = get_wib_time()
@@ -522,6 +1234,8 @@ def telegram_handler():
                     reply += f"📥 Deposit: {d_count} coins\n"
                     reply += f"📊 Total: {len(previous_withdraw)} chains, {len(previous_deposit)} coins\n"
                     reply += f"🔒 Data loaded: {initial_data_loaded}"
+                    if HA_MODE:
+                        reply += f"\n🖥️ Leader: {INSTANCE_ID}"
                     send_telegram_to(chat_id, reply)
 
                 elif command == '/reset':
@@ -537,118 +1251,218 @@ def telegram_handler():
             time.sleep(3)
 
 
-def on_message(ws, message):
+def frame_time(data):
+    """Waktu frame dari server (time_ms / time), fallback ke waktu lokal"""
+    if data.get('time_ms'):
+        return data['time_ms'] / 1000
+    if data.get('time'):
+        return float(data['time'])
+    return time.time()
+
+
+def apply_currency_update(result, seen_at):
     """
-    ✅ FIXED WebSocket handler:
+    Terapkan status satu currency (frame WS atau REST per-currency):
     - Withdraw: dari chains[].withdraw_disabled
     - Deposit: dari currency level deposit_disabled
+    Return True kalau state berubah.
     """
-    global previous_withdraw, previous_deposit
+    currency = result.get('currency', '')
+
+    if not currency:
+        return False
+
+    state_changed = False
+    wib = get_wib_time()
+
+    with state_lock:
+        # Frame/REST yang lebih tua dari data terakhir untuk currency ini → abaikan
+        if currency_last_seen.get(currency, 0) > seen_at:
+            return False
+        currency_last_seen[currency] = seen_at
+
+        # ====== DEPOSIT: dari currency level ======
+        deposit_disabled = result.get('deposit_disabled', False)
+        prev_deposit_val = previous_deposit.get(currency, None)
+
+        if prev_deposit_val is not None and prev_deposit_val != deposit_disabled:
+            state_changed = True
+
+            if deposit_disabled:
+                deposit_times[currency] = wib
+                tid = record_transition('deposit', 'masuk', currency, None)
+                emoji = "🔴"
+                action = "Masuk Deposit Maintenance"
+                print(f"\n{emoji} {action}: {currency}")
+            else:
+                tid = record_transition('deposit', 'keluar', currency, None, deposit_times.get(currency))
+                if currency in deposit_times:
+                    del deposit_times[currency]
+                emoji = "🟢"
+                action = "Keluar Deposit Maintenance"
+                print(f"\n{emoji} {action}: {currency}")
+
+            tg_msg = f"{emoji} <b>{action}</b>\n\n"
+            tg_msg += f"💰 Coin  : <b>{currency}</b>\n"
+            tg_msg += f"📅 Time  : {wib}"
+
+            threading.Thread(
+                target=send_notification,
+                args=(tid, tg_msg),
+                daemon=True
+            ).start()
+
+        elif prev_deposit_val is None and deposit_disabled:
+            state_changed = True
+            deposit_times[currency] = wib
+
+        previous_deposit[currency] = deposit_disabled
+
+        # ====== WITHDRAW: dari chains ======
+        chains = result.get('chains', [])
+        
+        for chain in chains:
+            chain_name = chain.get('name', '')
+            withdraw_disabled = chain.get('withdraw_disabled', False)
+            key = f"{currency}_{chain_name}"
+
+            prev_withdraw_val = previous_withdraw.get(key, None)
+
+            if prev_withdraw_val is not None and prev_withdraw_val != withdraw_disabled:
+                state_changed = True
+
+                if withdraw_disabled:
+                    withdraw_times[key] = wib
+                    tid = record_transition('withdraw', 'masuk', currency, chain_name)
+                    emoji = "🔴"
+                    action = "Masuk Withdraw Maintenance"
+                    print(f"\n{emoji} {action}: {currency} ({chain_name})")
+                else:
+                    tid = record_transition('withdraw', 'keluar', currency, chain_name, withdraw_times.get(key))
+                    if key in withdraw_times:
+                        del withdraw_times[key]
+                    emoji = "🟢"
+                    action = "Keluar Withdraw Maintenance"
+                    print(f"\n{emoji} {action}: {currency} ({chain_name})")
+
+                tg_msg = f"{emoji} <b>{action}</b>\n\n"
+                tg_msg += f"💰 Coin  : <b>{currency} ({chain_name})</b>\n"
+                tg_msg += f"📅 Time  : {wib}"
+
+                threading.Thread(
+                    target=send_notification,
+                    args=(tid, tg_msg),
+                    daemon=True
+                ).start()
+
+            elif prev_withdraw_val is None and withdraw_disabled:
+                state_changed = True
+                withdraw_times[key] = wib
+
+            previous_withdraw[key] = withdraw_disabled
+
+    return state_changed
+
+
+def on_message(ws, message):
+    """
+    WebSocket handler:
+    - sebelum snapshot REST awal selesai → frame di-buffer (replay_boot_buffer)
+    - setelahnya → handle_frame
+    """
+    global last_alive_at, boot_overflow
+
+    last_alive_at = time.time()
 
     if not initial_data_loaded:
-        return
+        with boot_lock:
+            if not initial_data_loaded:
+                if len(boot_buffer) >= BOOT_BUFFER_MAX:
+                    boot_overflow = True
+                    boot_buffer.clear()
+                if not boot_overflow:
+                    boot_buffer.append((last_alive_at, message))
+                return
+
+    handle_frame(message, last_alive_at)
+
+
+def handle_frame(message, received_at):
+    """Update spot.currency_status → apply_currency_update"""
+    global server_clock_offset
 
     try:
         data = json.loads(message)
+        seen_at = frame_time(data)
+        lag = received_at - seen_at
+        late = lag > FRAME_LAG_SECONDS
+
+        if not late:
+            server_clock_offset = -lag
 
         if data.get('event') == 'update' and data.get('channel') == 'spot.currency_status':
             result = data.get('result', {})
-            currency = result.get('currency', '')
-            
-            if not currency:
-                return
 
-            state_changed = False
-            wib = get_wib_time()
+            # Frame telat → server/klien sempat tertinggal, currency ini dicek ulang via REST
+            if late and result.get('currency'):
+                print(f"\n⚠️ Late frame ({lag:.0f}s): {result['currency']}")
+                with state_lock:
+                    gap_currencies.add(result['currency'])
 
-            with state_lock:
-                # ====== DEPOSIT: dari currency level ======
-                deposit_disabled = result.get('deposit_disabled', False)
-                prev_deposit_val = previous_deposit.get(currency, None)
-
-                if prev_deposit_val is not None and prev_deposit_val != deposit_disabled:
-                    state_changed = True
-
-                    if deposit_disabled:
-                        deposit_times[currency] = wib
-                        emoji = "🔴"
-                        action = "Masuk Deposit Maintenance"
-                        print(f"\n{emoji} {action}: {currency}")
-                    else:
-                        if currency in deposit_times:
-                            del deposit_times[currency]
-                        emoji = "🟢"
-                        action = "Keluar Deposit Maintenance"
-                        print(f"\n{emoji} {action}: {currency}")
-
-                    tg_msg = f"{emoji} <b>{action}</b>\n\n"
-                    tg_msg += f"💰 Coin  : <b>{currency}</b>\n"
-                    tg_msg += f"📅 Time  : {wib}"
-
-                    threading.Thread(
-                        target=send_telegram,
-                        args=(tg_msg,),
-                        daemon=True
-                    ).start()
-
-                elif prev_deposit_val is None and deposit_disabled:
-                    state_changed = True
-                    deposit_times[currency] = wib
-
-                previous_deposit[currency] = deposit_disabled
-
-                # ====== WITHDRAW: dari chains ======
-                chains = result.get('chains', [])
-                
-                for chain in chains:
-                    chain_name = chain.get('name', '')
-                    withdraw_disabled = chain.get('withdraw_disabled', False)
-                    key = f"{currency}_{chain_name}"
-
-                    prev_withdraw_val = previous_withdraw.get(key, None)
-
-                    if prev_withdraw_val is not None and prev_withdraw_val != withdraw_disabled:
-                        state_changed = True
-
-                        if withdraw_disabled:
-                            withdraw_times[key] = wib
-                            emoji = "🔴"
-                            action = "Masuk Withdraw Maintenance"
-                            print(f"\n{emoji} {action}: {currency} ({chain_name})")
-                        else:
-                            if key in withdraw_times:
-                                del withdraw_times[key]
-                            emoji = "🟢"
-                            action = "Keluar Withdraw Maintenance"
-                            print(f"\n{emoji} {action}: {currency} ({chain_name})")
-
-                        tg_msg = f"{emoji} <b>{action}</b>\n\n"
-                        tg_msg += f"💰 Coin  : <b>{currency} ({chain_name})</b>\n"
-                        tg_msg += f"📅 Time  : {wib}"
-
-                        threading.Thread(
-                            target=send_telegram,
-                            args=(tg_msg,),
-                            daemon=True
-                        ).start()
-
-                    elif prev_withdraw_val is None and withdraw_disabled:
-                        state_changed = True
-                        withdraw_times[key] = wib
-
-                    previous_withdraw[key] = withdraw_disabled
-
-            if state_changed:
+            if apply_currency_update(result, seen_at):
                 save_state()
 
     except Exception as e:
         print(f"\n❌ Parse error: {e}")
 
 
+def replay_boot_buffer(snapshot_at):
+    """
+    Replay frame yang masuk selama snapshot REST awal, urut sesuai kedatangan.
+    snapshot_at = awal attempt fetch yang berhasil; frame sebelumnya (termasuk
+    dari attempt yang gagal) sudah tercakup snapshot → dilewati.
+    Kalau buffer sempat penuh: tidak di-replay, diganti full REST check.
+    """
+    global initial_data_loaded
+
+    replayed = skipped = 0
+    while True:
+        with boot_lock:
+            frames = [] if boot_overflow else boot_buffer[:]
+            boot_buffer.clear()
+            if not frames:
+                initial_data_loaded = True
+                break
+
+        for received_at, message in frames:
+            if received_at < snapshot_at:
+                skipped += 1
+                continue
+            handle_frame(message, received_at)
+            replayed += 1
+
+    if boot_overflow:
+        print(f"⚠️ Boot buffer overflow (>{BOOT_BUFFER_MAX} frames) → full REST check")
+        full_rest_check()
+        return
+
+    print(f"⚡ Boot buffer: {replayed} frames replayed, {skipped} skipped")
+
+    # Reconnect sebelum snapshot_at → frame yang hilang sudah tercakup snapshot
+    if boot_reconnect_at is not None and boot_reconnect_at >= snapshot_at:
+        print("🔄 Reconnected during boot → full REST check")
+        full_rest_check()
+
+
 def on_error(ws, error):
     print(f"\n❌ WebSocket error: {error}")
 
 
+def on_pong(ws, message):
+    global last_alive_at
+    last_alive_at = time.time()
+
+
 def on_close(ws, close_status_code, close_msg):
     global ws_connected, reconnect_count
     ws_connected = False
@@ -657,7 +1471,7 @@ def on_close(ws, close_status_code, close_msg):
 
 
 def on_open(ws):
-    global ws_connected
+    global ws_connected, boot_reconnect_at
     ws_connected = True
     print(f"✅ WebSocket {'reconnected' if reconnect_count > 0 else 'connected'}!")
 
@@ -670,22 +1484,114 @@ def on_open(ws):
     print("📡 Subscribed to currency status")
 
     if reconnect_count > 0:
-        print("🔄 Post-reconnect REST check...")
-        threading.Thread(target=post_reconnect_check, daemon=True).start()
+        with boot_lock:
+            if not initial_data_loaded:
+                # Masih boot: dicek di replay_boot_buffer setelah snapshot selesai
+                boot_reconnect_at = time.time()
+                return
+
+        gap = time.time() - last_alive_at
+        print(f"🔄 Post-reconnect check (gap {gap:.0f}s)...")
+        threading.Thread(target=post_reconnect_check, args=(gap,), daemon=True).start()
+
+
+def get_gap_targets(gap_start):
+    """
+    Currency yang perlu dicek ulang setelah gap pendek:
+    - ada frame menjelang gap (perubahan cenderung beruntun)
+    - frame telat yang terdeteksi selama connected
+    Gap >= GAP_FULL_REFETCH_SECONDS tetap full REST check.
+    """
+    # currency_last_seen pakai jam server
+    window_start = gap_start + server_clock_offset - GAP_RECENT_SECONDS
+    with state_lock:
+        targets = {
+            currency for currency, seen in currency_last_seen.items() if seen >= window_start
+        }
+        targets.update(gap_currencies)
+        gap_currencies.clear()
+    return targets
 
 
-def post_reconnect_check():
-    time.sleep(3)
+def full_rest_check():
+    if RECONCILE_PROCESS_POOL:
+        return reconcile_in_process_pool()
+
+    currencies = check_maintenance_rest()
+    if currencies and currencies != "exit":
+        loaded_state = load_state()
+        process_maintenance_data(currencies, loaded_state)
+        return True
+    return False
+
+
+def post_reconnect_check(gap):
+    global full_check_pending
+
     try:
-        currencies = check_maintenance_rest()
-        if currencies and currencies != "exit":
-            loaded_state = load_state()
-            process_maintenance_data(currencies, loaded_state)
-            print("✅ Post-reconnect check complete")
+        if gap >= GAP_FULL_REFETCH_SECONDS:
+            print(f"🔄 Long gap ({gap:.0f}s) → full REST check")
+            if full_rest_check():
+                print("✅ Post-reconnect check complete")
+            return
+
+        targets = get_gap_targets(time.time() - gap)
+        if not targets or len(targets) > GAP_MAX_TARGETED:
+            # Channel sepi → tidak ada kandidat, perubahan selama gap hanya ketahuan lewat REST penuh
+            print(f"🔄 {len(targets)} currencies targeted → full REST check")
+            if full_rest_check():
+                print("✅ Post-reconnect check complete")
+            return
+
+        changed = fill_gap(targets)
+        print(f"✅ Post-reconnect gap-fill complete: {len(targets)} checked, {changed} changed")
+
+        # Targeted fill bisa melewatkan currency lain → full check di tick berikutnya, bukan 5 menit lagi
+        full_check_pending = True
     except Exception as e:
         print(f"❌ Post-reconnect check error: {e}")
 
 
+def fetch_currency_rest(currency):
+    url = f"{GATE_REST_URL}/spot/currencies/{urllib.parse.quote(currency)}"
+    req = urllib.request.Request(url)
+    req.add_header('User-Agent', 'Mozilla/5.0')
+
+    for attempt in range(2):
+        try:
+            with urllib.request.urlopen(req, timeout=10) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+        except Exception:
+            pass
+        if attempt < 1:
+            time.sleep(1)
+
+    print(f"\n⚠️ Gap-fill fetch failed: {currency}")
+    return None
+
+
+def fill_gap(currencies):
+    """Fetch per-currency (max GAP_FILL_CONCURRENCY paralel) lalu terapkan seperti frame WS"""
+    if not currencies:
+        return 0
+
+    # Pakai jam server supaya sebanding dengan field time di frame WS
+    seen_at = time.time() + server_clock_offset
+    changed = 0
+
+    with ThreadPoolExecutor(max_workers=GAP_FILL_CONCURRENCY) as pool:
+        for result in pool.map(fetch_currency_rest, sorted(currencies)):
+            if result and apply_currency_update(result, seen_at):
+                changed += 1
+
+    if changed:
+        save_state()
+    return changed
+
+
 def start_websocket():
     while True:
         try:
@@ -695,7 +1601,8 @@ def start_websocket():
                 on_open=on_open,
                 on_message=on_message,
                 on_error=on_error,
-                on_close=on_close
+                on_close=on_close,
+                on_pong=on_pong
             )
             ws.run_forever(ping_interval=20, ping_timeout=10)
         except Exception as e:
@@ -706,6 +1613,8 @@ def start_websocket():
 
 
 def periodic_check():
+    global full_check_pending
+
     check_count = 0
     while True:
         try:
@@ -719,27 +1628,282 @@ def periodic_check():
                 d = sum(1 for v in previous_deposit.values() if v)
             print(f"\r🔄 {wib} | {status} | W:{w} D:{d}", end="", flush=True)
 
+            # Frame telat selama connected → cek ulang currency tersebut saja
+            with state_lock:
+                late = set(gap_currencies)
+                gap_currencies.clear()
+            if late:
+                print(f"\n🔄 Gap-fill {len(late)} currencies (late frames)...")
+                fill_gap(late)
+
             # Save state setiap 5 menit
             if check_count % 10 == 0:
                 save_state()
 
-            # REST API re-check setiap 5 menit
-            if check_count % 10 == 0:
+            # REST API re-check setiap 5 menit, atau lebih cepat setelah gap-fill targeted
+            if check_count % 10 == 0 or full_check_pending:
+                full_check_pending = False
                 print(f"\n🔄 Periodic REST check #{check_count // 10}...")
                 try:
-                    currencies = check_maintenance_rest()
-                    if currencies and currencies != "exit":
-                        loaded_state = load_state()
-                        process_maintenance_data(currencies, loaded_state)
+                    full_rest_check()
                 except Exception as e:
                     print(f"❌ Periodic check error: {e}")
         except:
             break
 
 
+def get_changes_since(since):
+    """Transisi dengan version > since. reset=True kalau sebagian sudah terbuang → fetch ulang full list."""
+    with snapshot_cond:
+        events = [change for change in change_log if change['version'] > since]
+        reset = since < change_log_floor
+    return events, reset
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """
+    Read-only JSON API:
+    - GET /withdraw, /deposit, /currency/{c} (ETag = version snapshot)
+    - GET /changes?since=N&boot=B&timeout=S (long-poll, reset=True kalau boot beda)
+    """
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path.rstrip('/')
+        snapshot = state_snapshot
+
+        if snapshot is None:
+            return self.send_json(503, {'error': 'state not loaded'})
+
+        if path == '/changes':
+            return self.handle_changes(urllib.parse.parse_qs(url.query), snapshot)
+
+        if path == '/withdraw':
+            if self.not_modified(snapshot):
+                return
+            return self.send_body(200, snapshot['withdraw_body'], snapshot['etag'])
+
+        if path == '/deposit':
+            if self.not_modified(snapshot):
+                return
+            return self.send_body(200, snapshot['deposit_body'], snapshot['etag'])
+
+        if path.startswith('/currency/'):
+            currency = urllib.parse.unquote(path[len('/currency/'):]).upper()
+            if currency not in snapshot['deposit'] and currency not in snapshot['chains']:
+                return self.send_json(404, {'error': f'unknown currency {currency}'})
+            if self.not_modified(snapshot):
+                return
+
+            deposit_disabled = snapshot['deposit'].get(currency, False)
+            return self.send_json(200, {
+                'boot': BOOT_ID,
+                'version': snapshot['version'],
+                'updated': snapshot['updated'],
+                'currency': currency,
+                'deposit_disabled': deposit_disabled,
+                'deposit_since': snapshot['deposit_times'].get(currency) if deposit_disabled else None,
+                'chains': snapshot['chains'].get(currency, []),
+            }, snapshot['etag'])
+
+        self.send_json(404, {'error': 'not found'})
+
+    def not_modified(self, snapshot):
+        """304 kalau client sudah punya versi ini (hanya untuk resource yang ada)"""
+        if self.headers.get('If-None-Match') != snapshot['etag']:
+            return False
+        self.send_response(304)
+        self.send_header('ETag', snapshot['etag'])
+        self.end_headers()
+        return True
+
+    def handle_changes(self, query, snapshot):
+        try:
+            since = int(query.get('since', ['0'])[0])
+            timeout = float(query.get('timeout', ['25'])[0])
+        except ValueError:
+            return self.send_json(400, {'error': 'invalid since/timeout'})
+
+        if not math.isfinite(timeout) or timeout < 0:
+            return self.send_json(400, {'error': 'invalid since/timeout'})
+        timeout = max(0, min(timeout, API_MAX_WAIT))
+
+        # Version dari process lain (restart / HA takeover) tidak bisa dibandingkan → reset
+        boot = query.get('boot', [BOOT_ID])[0]
+        if boot != BOOT_ID or since > snapshot['version']:
+            return self.send_json(200, {
+                'boot': BOOT_ID,
+                'version': snapshot['version'],
+                'reset': True,
+                'events': [],
+            })
+
+        if snapshot['version'] <= since:
+            with snapshot_cond:
+                snapshot_cond.wait_for(lambda: state_snapshot['version'] > since, timeout)
+
+        events, reset = get_changes_since(since)
+        self.send_json(200, {
+            'boot': BOOT_ID,
+            'version': state_snapshot['version'],
+            'reset': reset,
+            'events': events,
+        })
+
+    def send_json(self, status, payload, etag=None):
+        self.send_body(status, json.dumps(payload).encode('utf-8'), etag)
+
+    def send_body(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_api_server():
+    try:
+        server = ThreadingHTTPServer((API_HOST, API_PORT), ApiHandler)
+        server.daemon_threads = True
+        print(f"🌐 HTTP API: http://{API_HOST}:{API_PORT}")
+        server.serve_forever()
+    except Exception as e:
+        print(f"\n❌ HTTP API error: {e}")
+
+
+def try_acquire_leader():
+    """Non-blocking flock; lock otomatis lepas kalau process leader mati"""
+    global ha_lock_fd
+
+    fd = open(HA_LOCK_FILE, 'a+', encoding='utf-8')
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        fd.close()
+        return False
+
+    fd.seek(0)
+    fd.truncate()
+    fd.write(f"{INSTANCE_ID}\n")
+    fd.flush()
+    ha_lock_fd = fd
+    return True
+
+
+def get_leader_id():
+    try:
+        with open(HA_LOCK_FILE, 'r', encoding='utf-8') as f:
+            return f.read().strip() or "Unknown"
+    except OSError:
+        return "Unknown"
+
+
+def tail_state(last_mtime):
+    """Reload STATE_FILE kalau berubah sejak last_mtime → (mtime, state atau None)"""
+    try:
+        mtime = os.stat(STATE_FILE).st_mtime_ns
+    except OSError:
+        return last_mtime, None
+
+    if mtime == last_mtime:
+        return last_mtime, None
+
+    data = load_state(quiet=True)
+    return (mtime, data) if data else (last_mtime, None)
+
+
+def run_standby():
+    """
+    Blok sampai lock leader didapat. Selama standby state leader di-tail
+    (hot copy di memory), return state terbaru untuk warm start saat takeover.
+    """
+    print(f"🟡 Standby ({INSTANCE_ID}), leader: {get_leader_id()}")
+
+    last_mtime = None
+    hot_state = None
+
+    while not try_acquire_leader():
+        last_mtime, data = tail_state(last_mtime)
+        if data:
+            hot_state = data
+        time.sleep(HA_POLL_SECONDS)
+
+    # Leader lama sempat menulis setelah poll terakhir?
+    last_mtime, data = tail_state(last_mtime)
+    if data:
+        hot_state = data
+
+    print(f"🟢 Takeover: {INSTANCE_ID} is now leader")
+    return hot_state
+
+
+def load_sent_ids():
+    """Transition id yang sudah dinotifikasi leader sebelumnya (de-dup saat takeover)"""
+    if not os.path.exists(HA_SENT_FILE):
+        return
+
+    try:
+        with open(HA_SENT_FILE, 'r', encoding='utf-8') as f:
+            lines = f.read().split()
+
+        with sent_lock:
+            for tid in lines[-HA_SENT_KEEP:]:
+                remember_sent_id(tid)
+                seq_key, _, seq = tid.rpartition(':')
+                if seq.isdigit():
+                    sent_seq_max[seq_key] = max(sent_seq_max.get(seq_key, 0), int(seq))
+
+            # Compact supaya file tidak tumbuh terus
+            if len(lines) > HA_SENT_KEEP:
+                compact_sent_log()
+    except Exception as e:
+        print(f"⚠️ Error loading sent log: {e}")
+
+
+def load_history_seq_max():
+    """
+    Seq tertinggi per key dari kolom tid di history DB → digabung ke sent_seq_max.
+    Menutup kasus yang tidak tercatat di sent log (notifikasi gagal, sent log
+    ter-compact) supaya transisi baru tidak bentrok dengan tid yang sudah ada
+    dan baris history-nya tidak hilang karena INSERT OR IGNORE.
+    """
+    try:
+        conn = open_history_db()
+        try:
+            rows = conn.execute("SELECT tid FROM transitions WHERE tid IS NOT NULL")
+            for (tid,) in rows:
+                seq_key, _, seq = tid.rpartition(':')
+                if seq.isdigit():
+                    sent_seq_max[seq_key] = max(sent_seq_max.get(seq_key, 0), int(seq))
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"⚠️ Error loading history seq: {e}")
+
+
+def advance_seq_past_sent():
+    """
+    Setelah snapshot REST awal (transisi yang dideteksi ulang sudah di-dedup):
+    seq dinaikkan melewati id di sent log + history DB, supaya transisi baru
+    berikutnya tidak memakai id yang sudah dipakai leader lama (misal masuk
+    terkirim, lalu keluar terjadi saat failover dan tidak pernah terdeteksi).
+    """
+    with state_lock:
+        for seq_key, seq in sent_seq_max.items():
+            if transition_seq.get(seq_key, 0) < seq:
+                transition_seq[seq_key] = seq
+    sent_seq_max.clear()
+
+
 def main():
     global previous_withdraw, previous_deposit
-    global withdraw_times, deposit_times, initial_data_loaded
+    global withdraw_times, deposit_times, transition_seq, initial_data_loaded
+    global history_enabled
 
     wib_now = get_wib_time()
 
@@ -753,12 +1917,64 @@ def main():
     if TELEGRAM_CHAT_ID == "YOUR_CHAT_ID_HERE":
         print("⚠️ WARNING: TELEGRAM_CHAT_ID not set!")
 
-    loaded_state = load_state()
+    takeover = False
+    hot_state = None
+    if HA_MODE:
+        if fcntl is None:
+            print("❌ HA_MODE requires fcntl (POSIX)")
+            return
+
+        if try_acquire_leader():
+            print(f"🟢 Leader: {INSTANCE_ID}")
+        else:
+            try:
+                hot_state = run_standby()
+            except KeyboardInterrupt:
+                print(f"\n\n👋 Standby stopped at {get_wib_time()}")
+                return
+            takeover = True
+            wib_now = get_wib_time()
+
+        load_sent_ids()
+
+    history_enabled = init_history_db()
+    if history_enabled:
+        threading.Thread(target=history_writer, daemon=True).start()
+        if HA_MODE:
+            load_history_seq_max()
+
+    loaded_state = hot_state or load_state()
 
     if loaded_state:
         withdraw_times = loaded_state.get('withdraw_times', {})
         deposit_times = loaded_state.get('deposit_times', {})
+        transition_seq = loaded_state.get('transition_seq', {})
         print(f"📂 Last update: {loaded_state.get('last_update', 'Unknown')}")
+    elif HA_MODE:
+        # State hilang (/reset, file terhapus): seq mulai dari 0 → tidak ada yang
+        # bisa di-dedup, langsung lewati semua id lama sebelum snapshot REST
+        advance_seq_past_sent()
+
+    if API_PORT:
+        threading.Thread(target=start_api_server, daemon=True).start()
+
+    # Warm start: command + WebSocket langsung jalan dari state tersimpan
+    # HA: selalu warm start supaya takeover tidak menunggu snapshot REST
+    warm_start = (WARM_START or HA_MODE) and loaded_state
+    if warm_start:
+        with save_lock:
+            with state_lock:
+                previous_withdraw = dict(loaded_state.get('withdraw', {}))
+                previous_deposit = dict(loaded_state.get('deposit', {}))
+                data = copy_state()
+                changes = take_pending_changes()
+            publish_snapshot(data, changes)
+
+        print("\n⚡ Warm start: serving persisted state, buffering WebSocket...")
+        print("=" * 60)
+
+        threading.Thread(target=telegram_handler, daemon=True).start()
+        threading.Thread(target=start_websocket, daemon=True).start()
 
     currencies = check_maintenance_rest()
 
@@ -777,24 +1993,36 @@ def main():
 
     process_maintenance_data(currencies, loaded_state)
 
-    initial_data_loaded = True
+    if HA_MODE:
+        advance_seq_past_sent()
 
-    print("\n👀 Starting WebSocket...")
-    print("=" * 60)
+    if warm_start:
+        replay_boot_buffer(rest_fetch_started_at)
+        # Setelah boot selesai → tidak ada diff paralel dengan process_maintenance_data di atas
+        threading.Thread(target=periodic_check, daemon=True).start()
+    else:
+        initial_data_loaded = True
+
+        print("\n👀 Starting WebSocket...")
+        print("=" * 60)
 
-    threading.Thread(target=telegram_handler, daemon=True).start()
-    threading.Thread(target=start_websocket, daemon=True).start()
-    threading.Thread(target=periodic_check, daemon=True).start()
+        threading.Thread(target=telegram_handler, daemon=True).start()
+        threading.Thread(target=start_websocket, daemon=True).start()
+        threading.Thread(target=periodic_check, daemon=True).start()
 
     w = sum(1 for v in previous_withdraw.values() if v)
     d = sum(1 for v in previous_deposit.values() if v)
 
-    startup_msg = f"🤖 <b>Bot Started</b>\n\n"
+    startup_msg = f"🤖 <b>{'Bot Takeover' if takeover else 'Bot Started'}</b>\n\n"
     startup_msg += f"📅 {wib_now}\n"
     startup_msg += f"📤 Withdraw: {w} chains\n"
     startup_msg += f"📥 Deposit: {d} coins\n"
     startup_msg += f"📊 Total: {len(previous_withdraw)} chains, {len(previous_deposit)} coins"
-    if loaded_state:
+    if HA_MODE:
+        startup_msg += f"\n🖥️ Leader: {INSTANCE_ID}"
+    if warm_start:
+        startup_msg += f"\n⚡ <i>Warm start</i>"
+    elif loaded_state:
         startup_msg += f"\n📂 <i>State restored</i>"
 
     result = send_telegram(startup_msg)
@@ -810,6 +2038,7 @@ def main():
         wib = get_wib_time()
         print(f"\n\n👋 Stopped at {wib}")
         save_state()
+        flush_history()
         send_telegram(f"🛑 <b>Bot Stopped</b>\n\n📅 {wib}")
 
 